@@ -5,7 +5,7 @@ import json
 import fastapi.responses
 from dependency_injector.wiring import Provide, inject
 from fastapi import APIRouter, UploadFile, File, Depends
-from starlette.responses import HTMLResponse, JSONResponse
+from starlette.responses import JSONResponse
 
 from containers import RootContainer
 from models.file_model import FileModel
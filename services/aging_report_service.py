@@ -1,32 +1,35 @@
+import asyncio
 import csv
 import io
-import logging
+import itertools
 import re
 import time
-from datetime import datetime, timedelta
-from typing import List, Optional, Tuple, Dict, Any, Union
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple, Dict, Any, Union, Callable, Iterable
 import zipfile
 
 import openpyxl
-from openpyxl.styles import PatternFill
 
 from models.file_model import FileModel
 from models.response_base import ResponseBase
+from services.multi_logging import LoggingService
 from utils.schema_config import (
     aging_report_daily_data_import_schema, 
-    BaseSchema, 
-    ExportSchema, 
     ImportSchema, 
     aging_report_data_schema,
     aging_report_fully_paid_schema,
     aging_report_not_fully_paid_schema,
-    ImportField, 
-    ExportField
+    parse_date
 )
 
-# Initialize logger with detailed configuration
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# Initialize logger
+logger = LoggingService().get_logger(__name__)
+
+# Extracts the state from data file names such as 'Sales Aged Balance - VIC.csv'
+_STATE_RE = re.compile(r'(?:Sales[ _]?Aged[ _]?Balance[ _]?(?:\s*-\s*)?|SalesAgedBalance)(\w+)\.csv', re.IGNORECASE)
+
+# Description text marking the totals rows at the end of each daily export
+_TOTALS_TEXTS = ('Total Invoices', 'Total Payments', 'Total Bankings')
 
 
 class AgingReportService:
@@ -47,7 +50,7 @@ class AgingReportService:
             Parsed datetime object or None if parsing fails
         """
         if not date_string:
-            logger.debug(f"Empty date string provided, returning None")
+            logger.debug("Empty date string provided, returning None")
             return None
 
         # Ensure formats is a list
@@ -55,15 +58,9 @@ class AgingReportService:
             logger.debug(f"Converting single format '{formats}' to list")
             formats = [formats]
 
-        # Try each format
-        for fmt in formats:
-            try:
-                parsed_date = datetime.strptime(date_string, fmt)
-                logger.debug(f"Successfully parsed date '{date_string}' with format '{fmt}'")
-                return parsed_date
-            except ValueError:
-                logger.debug(f"Failed to parse date '{date_string}' with format '{fmt}'")
-                continue
+        parsed_date = parse_date(date_string, tuple(formats))
+        if parsed_date is not None:
+            return parsed_date
 
         # If all formats fail, return None
         logger.warning(f"Failed to parse date '{date_string}' with any provided formats: {formats}")
@@ -95,19 +92,21 @@ class AgingReportService:
 
     def _load_and_process_mapping_file(
         self, mapping_file: FileModel, errors: List[str]
-    ) -> Optional[Tuple[List[Dict[str, str]], List[Dict[str, str]], List[Dict[str, Union[str, int, None]]]]]:
+    ) -> Optional[Tuple[List[Dict[str, str]], List[Dict[str, str]], List[Dict[str, Union[str, int, None]]], List[List[str]]]]:
         """
         Loads and processes the mapping file to create lookup dictionaries.
-        Returns a tuple of dictionaries or None if a critical error occurs.
+        Returns a tuple of the lookup lists followed by the raw CSV rows (kept for the
+        Tables sheet), or None if a critical error occurs.
         """
         logger.info(f"Processing mapping file: {mapping_file.name}")
 
         try:
-            # Decode using UTF-8-SIG encoding to remove BOM if present
-            tables_data_str = mapping_file.content.decode('utf-8-sig')
-            logger.debug(f"Successfully decoded mapping file content ({len(tables_data_str)} characters)")
-            tables_data_reader = csv.reader(io.StringIO(tables_data_str))
-            logger.debug("Created CSV reader for mapping file to access columns by index")
+            # Decode incrementally while parsing (UTF-8-SIG removes the BOM if present)
+            # instead of building the whole file as one string first. The raw rows are
+            # kept for the Tables sheet anyway, so they are read in one go here.
+            text_stream = io.TextIOWrapper(io.BytesIO(mapping_file.content), encoding='utf-8-sig', newline='')
+            tables_rows: List[List[str]] = list(csv.reader(text_stream))
+            logger.debug(f"Successfully parsed {len(tables_rows)} rows from mapping file")
         except Exception as decode_error:
             error_msg = f"Error decoding mapping file {mapping_file.name}: {str(decode_error)}"
             logger.error(error_msg, exc_info=True)
@@ -121,53 +120,59 @@ class AgingReportService:
         mapping_errors_count = 0  # For potential future use to count row-specific parsing errors
 
         logger.info("Building lookup dictionaries from mapping file using column indices")
-        tables_data = list(tables_data_reader)
+        mapping_file_headers = tables_rows[0] if tables_rows else None
 
-        if not tables_data:
+        if mapping_file_headers is None:
             error_msg = f"Mapping file {mapping_file.name} is empty or contains no header row."
             logger.error(error_msg)
             errors.append(error_msg)
             return None
-            
-        mapping_file_headers = tables_data[0]
-        data_rows = tables_data[1:] # Skip header row for data processing
 
         # The col 0 and 1 of the mapping file is for Division and Sub Division
+        div_subdiv_header_indices: Tuple[int, int] = (0, 1)
+        division_subdivision_headers: Optional[List[str]] = None
         try:
-            div_subdiv_header_indices: Tuple[int, int] = (0, 1)
-            division_subdivision_headers: List[str] = [mapping_file_headers[i] for i in div_subdiv_header_indices]
-            division_to_subdivision_raw: List[List[str]] = [[row[i] for i in div_subdiv_header_indices if i < len(row)] for row in data_rows]
-            division_to_subdivision: List[Dict[str, str]] = [
-                dict(zip(division_subdivision_headers, row_values))
-                for row_values in division_to_subdivision_raw
-                if len(row_values) == len(division_subdivision_headers) and all(row_values)
-            ]
+            division_subdivision_headers = [mapping_file_headers[i] for i in div_subdiv_header_indices]
         except IndexError:
             errors.append(f"Mapping file {mapping_file.name} has insufficient columns for Division/Sub Division mapping.")
             logger.warning(f"Skipping Division/Sub Division mapping due to insufficient columns in {mapping_file.name}.")
 
-
         # The col 3 and 4 of the mapping file is for DivisionNo and Division
+        divno_div_header_indices: Tuple[int, int] = (3, 4)
+        divisionno_division_headers: Optional[List[str]] = None
         try:
-            divno_div_header_indices: Tuple[int, int] = (3, 4)
-            divisionno_division_headers: List[str] = [mapping_file_headers[i] for i in divno_div_header_indices]
-            divisionno_to_division_raw: List[List[str]] = [[row[i] for i in divno_div_header_indices if i < len(row)] for row in data_rows]
-            divisionno_to_division: List[Dict[str, str]] = [
-                dict(zip(divisionno_division_headers, row_values))
-                for row_values in divisionno_to_division_raw
-                if len(row_values) == len(divisionno_division_headers) and all(row_values)
-            ]
+            divisionno_division_headers = [mapping_file_headers[i] for i in divno_div_header_indices]
         except IndexError:
             errors.append(f"Mapping file {mapping_file.name} has insufficient columns for DivisionNo/Division mapping.")
             logger.warning(f"Skipping DivisionNo/Division mapping due to insufficient columns in {mapping_file.name}.")
 
         # The col 6, 7, 9 of the mapping file is for Division Name, State, Days
+        div_state_days_indices: Tuple[int, int, int] = (6, 7, 9)
+        division_state_days_headers: Optional[List[str]] = None
         try:
-            div_state_days_indices: Tuple[int, int, int] = (6, 7, 9)
-            division_state_days_headers: List[str] = [mapping_file_headers[i] for i in div_state_days_indices]
-            
-            for row in data_rows:
-                if all(i < len(row) for i in div_state_days_indices): # Ensure all indices are within row bounds
+            division_state_days_headers = [mapping_file_headers[i] for i in div_state_days_indices]
+        except IndexError:
+            errors.append(f"Mapping file {mapping_file.name} has insufficient columns for Division/State/Days mapping.")
+            logger.warning(f"Skipping Division/State/Days mapping due to insufficient columns in {mapping_file.name}.")
+
+        # Build all three mappings in a single pass over the data rows
+        row_count = 1  # Header row
+        for row in itertools.islice(tables_rows, 1, None):
+            row_count += 1
+            row_len = len(row)
+
+            if division_subdivision_headers is not None:
+                row_values = [row[i] for i in div_subdiv_header_indices if i < row_len]
+                if len(row_values) == len(division_subdivision_headers) and all(row_values):
+                    division_to_subdivision.append(dict(zip(division_subdivision_headers, row_values)))
+
+            if divisionno_division_headers is not None:
+                row_values = [row[i] for i in divno_div_header_indices if i < row_len]
+                if len(row_values) == len(divisionno_division_headers) and all(row_values):
+                    divisionno_to_division.append(dict(zip(divisionno_division_headers, row_values)))
+
+            if division_state_days_headers is not None:
+                if all(i < row_len for i in div_state_days_indices): # Ensure all indices are within row bounds
                     raw_row_list = [row[div_state_days_indices[0]], row[div_state_days_indices[1]], row[div_state_days_indices[2]]]
                     entry: Dict[str, Union[str, int, None]] = dict(zip(division_state_days_headers, raw_row_list))
                     try:
@@ -177,19 +182,18 @@ class AgingReportService:
                         else:
                             entry["Days"] = None 
                     except ValueError:
-                        logger.warning(f"Could not convert 'Days' value '{entry.get('Days')}' to int for entry: {entry} in {mapping_file.name}")
+                        logger.warning("Could not convert 'Days' value '%s' to int for entry: %s in %s",
+                                       entry.get('Days'), entry, mapping_file.name)
                         entry["Days"] = None 
                     
                     if entry.get(mapping_file_headers[div_state_days_indices[1]]) and entry.get(mapping_file_headers[div_state_days_indices[0]]): # Check using actual header names for State and Division Name
                          division_state_days.append(entry)
                 else:
-                    logger.warning(f"Skipping mapping row in {mapping_file.name} due to insufficient columns for Division/State/Days: {row}")
-        except IndexError:
-            errors.append(f"Mapping file {mapping_file.name} has insufficient columns for Division/State/Days mapping.")
-            logger.warning(f"Skipping Division/State/Days mapping due to insufficient columns in {mapping_file.name}.")
+                    logger.warning("Skipping mapping row in %s due to insufficient columns for Division/State/Days: %s",
+                                   mapping_file.name, row)
 
 
-        logger.info(f"Completed processing {len(tables_data)} rows from mapping file: {mapping_file.name}")
+        logger.info(f"Completed processing {row_count} rows from mapping file: {mapping_file.name}")
         logger.info(f"Created lookup dictionaries: division_to_subdivision ({len(division_to_subdivision)} entries), "
                    f"divisionno_to_division ({len(divisionno_to_division)} entries), "
                    f"division_state_days ({len(division_state_days)} entries)")
@@ -197,7 +201,7 @@ class AgingReportService:
         if mapping_errors_count > 0: # This count is not currently incremented but is here for structure
             logger.warning(f"Encountered {mapping_errors_count} issues while processing mapping file rows from {mapping_file.name}.")
 
-        return division_to_subdivision, divisionno_to_division, division_state_days
+        return division_to_subdivision, divisionno_to_division, division_state_days, tables_rows
 
     def _validate_and_extract_file_info(self, data_files: List['FileModel'], errors: List[str]) -> List[Tuple[str, 'FileModel']]:
         """
@@ -223,7 +227,7 @@ class AgingReportService:
             logger.info(f"Validating file {file_idx}/{len(data_files)}: {data_file.name}")
 
             # Extract state from filename using regex pattern
-            state_match = re.search(r'(?:Sales[ _]?Aged[ _]?Balance[ _]?(?:\s*-\s*)?|SalesAgedBalance)(\w+)\.csv', data_file.name, re.IGNORECASE)
+            state_match = _STATE_RE.search(data_file.name)
             if not state_match:
                 error_msg = (f"Unable to extract state from filename: {data_file.name}. Expected formats: "
                            f"'Sales Aged Balance [state].csv', 'SalesAgedBalance[state].csv', 'Sales_Aged_Balance_[state].csv', or 'Sales Aged Balance - [state].csv'")
@@ -251,15 +255,11 @@ class AgingReportService:
         all_filtered_data = []
         
         for state, data_file in file_info_list:
-            file_start_time = time.time()
             logger.info(f"Processing data file: {data_file.name} (State: {state})")
 
             try:
-                # Load data using schema
-                daily_data = self.daily_data_import_schema.import_data(data_file.content, errors)
-                logger.info(f'Loaded {len(daily_data)} rows from {data_file.name}')
-
-                # Filter data based on business rules
+                # Stream rows from the schema import straight into the business rule filters
+                daily_data = self.daily_data_import_schema.iter_data(data_file.content, errors)
                 filtered_data = self._apply_data_filters(daily_data, state)
                 logger.info(f"Filtered to {len(filtered_data)} rows for {data_file.name}")
                 
@@ -273,12 +273,12 @@ class AgingReportService:
 
         return all_filtered_data
 
-    def _apply_data_filters(self, daily_data: List[Dict[str, Any]], state: str) -> List[Dict[str, Any]]:
+    def _apply_data_filters(self, daily_data: Iterable[Dict[str, Any]], state: str) -> List[Dict[str, Any]]:
         """
         Applies business rule filters to the daily data.
         
         Args:
-            daily_data: Raw data from the CSV file
+            daily_data: Rows from the CSV file, consumed in a single pass
             state: State code to add to each row
             
         Returns:
@@ -292,9 +292,15 @@ class AgingReportService:
             "totals_rows": 0
         }
 
-        logger.info(f"Applying filters to {len(daily_data)} rows")
+        logger.info(f"Applying filters for state {state}")
 
-        for row_idx, row_dict in enumerate(daily_data):
+        # Exclusion reason per distinct description (None when the description is kept)
+        description_exclusions: Dict[str, Optional[str]] = {}
+
+        row_count = 0
+        # Per-row exclusions are only counted; the breakdown is logged once at the end
+        for row_dict in daily_data:
+            row_count += 1
             # Extract key fields for filtering
             cheque_date = row_dict.get('Cheque_Date')
             gross_total = row_dict.get('Gross_Tot')
@@ -303,33 +309,52 @@ class AgingReportService:
             # Apply exclusion rules
             if cheque_date is not None:
                 excluded_count["cheque_date"] += 1
-                logger.debug(f"Excluding row {row_idx}: Non-null Cheque_Date={cheque_date}")
                 continue
                 
             if gross_total == 0:
                 excluded_count['zero_gross'] += 1
-                logger.debug(f'Excluding row {row_idx}: Zero Gross_Tot')
-                continue
-                
-            if description and "Buyer Cancellation Fees" in str(description):
-                excluded_count["cancellation"] += 1
-                logger.debug(f"Excluding row {row_idx}: Buyer Cancellation Fees in description")
                 continue
                 
-            if description and any(total_text in str(description) for total_text in ['Total Invoices', 'Total Payments', 'Total Bankings']):
-                excluded_count["totals_rows"] += 1
-                logger.debug(f"Excluding row {row_idx}: Found totals text in description: '{description}'")
-                continue
+            if description:
+                # Descriptions repeat across rows, so only scan each distinct value once
+                exclusion = description_exclusions.get(description, "")
+                if exclusion == "":
+                    exclusion = description_exclusions[description] = self._classify_description(str(description))
+
+                if exclusion == "cancellation":
+                    excluded_count["cancellation"] += 1
+                    continue
+
+                if exclusion == "totals_rows":
+                    excluded_count["totals_rows"] += 1
+                    continue
 
             # Add state and include row
             row_dict['State'] = state
             filtered_data.append(row_dict)
 
-        logger.info(f"Filtering complete. Kept {len(filtered_data)} rows, excluded {len(daily_data) - len(filtered_data)} rows")
+        logger.info(f"Filtering complete. Kept {len(filtered_data)} rows, excluded {row_count - len(filtered_data)} rows")
         logger.info(f"Exclusion breakdown: {excluded_count}")
         
         return filtered_data
 
+    @staticmethod
+    def _classify_description(description: str) -> Optional[str]:
+        """
+        Determines whether a description excludes its row from the report.
+        
+        Args:
+            description: The row description
+            
+        Returns:
+            The exclusion reason ("cancellation" or "totals_rows"), or None if the row is kept
+        """
+        if "Buyer Cancellation Fees" in description:
+            return "cancellation"
+        if any(total_text in description for total_text in _TOTALS_TEXTS):
+            return "totals_rows"
+        return None
+
     def _transform_data_rows(self, filtered_data: List[Dict[str, Any]], mapping_data: Tuple, reporting_date: datetime, errors: List[str]) -> List[Dict[str, Any]]:
         """
         Transforms filtered data by computing new columns based on business logic.
@@ -344,24 +369,47 @@ class AgingReportService:
             Transformed data with computed columns
         """
         division_to_subdivision, divisionno_to_division, division_state_days = mapping_data
+
+        # Index the mapping entries once so each row does dict lookups instead of scanning the lists
+        division_lookup = self._index_mapping_entries(
+            divisionno_to_division, lambda item: item.get("DivisionNo"))
+        state_days_lookup = self._index_mapping_entries(
+            division_state_days, lambda item: f"{item.get('State')}-{item.get('Division Name')}")
+        subdivision_lookup = self._index_mapping_entries(
+            division_to_subdivision, lambda item: item.get("Division"))
+
+        # Resolve the DivisionNo -> Division -> Sub Division chain once per division number,
+        # so each row needs a single probe instead of two chained lookups
+        division_chain = {
+            division_no: (division_entry, subdivision_lookup.get(division_entry.get("Division", "")))
+            for division_no, division_entry in division_lookup.items()
+        }
+
         transformed_rows = []
         mapping_errors = []
 
         logger.info(f"Transforming {len(filtered_data)} rows")
 
+        # The "To be Collected" column always comes from the same DayN column
+        day_key = f"Day{reporting_date.day}"
+        # Days late are counted against the reporting day, which is the same for every row
+        reporting_day = reporting_date.date()
+        # All mapping lookups for a row depend only on its (State, DivisionNo) pair,
+        # which repeats across thousands of rows, so each pair is resolved once
+        resolved_mappings: Dict[Tuple[str, Any], Tuple] = {}
+
+        # Rows come fresh from the import and are not reused after this step, so the
+        # derived columns are added in place rather than on a per-row copy
         for row_dict in filtered_data:
-            new_row = row_dict.copy()
-            
             if not row_dict.get('Classification'):
-                logger.debug(f"Skipping row without Classification: {row_dict.get('Sale_No', 'Unknown')}")
-                transformed_rows.append(new_row)
+                logger.debug("Skipping row without Classification: %s", row_dict.get('Sale_No', 'Unknown'))
+                transformed_rows.append(row_dict)
                 continue
 
             try:
-                self._compute_derived_columns(new_row, row_dict, division_to_subdivision, 
-                                            divisionno_to_division, division_state_days, 
-                                            reporting_date, mapping_errors)
-                transformed_rows.append(new_row)
+                self._compute_derived_columns(row_dict, division_chain, state_days_lookup, 
+                                            reporting_day, day_key, resolved_mappings, mapping_errors)
+                transformed_rows.append(row_dict)
                 
             except Exception as e:
                 error_msg = f"Error transforming row {row_dict.get('Sale_No', 'Unknown')}: {str(e)}"
@@ -383,133 +431,166 @@ class AgingReportService:
         logger.info(f"Completed transformation of {len(transformed_rows)} rows")
         return transformed_rows
 
-    def _compute_derived_columns(self, new_row: Dict[str, Any], row_dict: Dict[str, Any], 
-                                division_to_subdivision: List[Dict[str, str]], 
-                                divisionno_to_division: List[Dict[str, str]], 
-                                division_state_days: List[Dict[str, Union[str, int, None]]], 
-                                reporting_date: datetime, mapping_errors: List[str]) -> None:
+    @staticmethod
+    def _index_mapping_entries(entries: List[Dict[str, Any]], key_func: Callable[[Dict[str, Any]], Any]) -> Dict[Any, Dict[str, Any]]:
+        """
+        Indexes mapping entries by the given key.
+        The first entry wins for duplicate keys, matching a first-match linear scan.
+        
+        Args:
+            entries: Mapping entries to index
+            key_func: Function computing the lookup key of an entry
+            
+        Returns:
+            Dictionary mapping keys to their first matching entry
+        """
+        index: Dict[Any, Dict[str, Any]] = {}
+        for entry in entries:
+            index.setdefault(key_func(entry), entry)
+        return index
+
+    @staticmethod
+    def _resolve_division_mapping(state_val: str, division_no: Any,
+                                  division_chain: Dict[str, Tuple[Dict[str, str], Optional[Dict[str, str]]]],
+                                  state_days_lookup: Dict[str, Dict[str, Union[str, int, None]]]) -> Tuple:
+        """
+        Resolves every mapping lookup for a (State, DivisionNo) pair in one step.
+        
+        Args:
+            state_val: State of the row
+            division_no: DivisionNo of the row
+            division_chain: Division and sub division mapping entries, keyed by DivisionNo
+            state_days_lookup: Payment days mapping, keyed by State-Division Name
+            
+        Returns:
+            Tuple of (division entry, sub division entry, division name, State-Division Name,
+            payment days entry); missing entries are None
+        """
+        division_entry, subdivision_entry = division_chain.get(division_no, (None, None))
+        division_name = division_entry.get("Division", "") if division_entry else ""
+        state_division = f"{state_val}-{division_name}" if state_val and division_name else ""
+        state_days_entry = state_days_lookup.get(state_division)
+        return division_entry, subdivision_entry, division_name, state_division, state_days_entry
+
+    def _compute_derived_columns(self, row_dict: Dict[str, Any], 
+                                division_chain: Dict[str, Tuple[Dict[str, str], Optional[Dict[str, str]]]], 
+                                state_days_lookup: Dict[str, Dict[str, Union[str, int, None]]], 
+                                reporting_day: date, day_key: str, resolved_mappings: Dict[Tuple[str, Any], Tuple],
+                                mapping_errors: List[str]) -> None:
         """
         Computes all derived columns (43-55) for a single row.
         
         Args:
-            new_row: Row dictionary to update with computed values
-            row_dict: Original row data
-            division_to_subdivision: Division to subdivision mapping
-            divisionno_to_division: Division number to division mapping  
-            division_state_days: State/division to payment days mapping
-            reporting_date: Date for calculations
+            row_dict: Row data, updated in place with the computed values
+            division_chain: Division and sub division mapping entries, keyed by DivisionNo
+            state_days_lookup: Payment days mapping, keyed by State-Division Name
+            reporting_day: Reporting date (without time) for the days late calculation
+            day_key: Name of the DayN column holding the amount still to be collected
+            resolved_mappings: Cache of resolved mapping lookups per (State, DivisionNo), filled as new pairs are seen
             mapping_errors: List to append mapping errors
         """
-        # Column 46 (AT): Lookup Division from DivisionNo
+        # Source fields and computed values are kept in locals so each key is hashed once
         division_no = row_dict.get('Division')
-        division_entry = next((item for item in divisionno_to_division if item.get("DivisionNo") == division_no), None)
+        state_val = row_dict.get('State') or ""
+        mapping_key = (state_val, division_no)
+        resolved = resolved_mappings.get(mapping_key)
+        if resolved is None:
+            resolved = resolved_mappings[mapping_key] = self._resolve_division_mapping(
+                state_val, division_no, division_chain, state_days_lookup)
+        division_entry, subdivision_entry, division_name, state_division, state_days_entry = resolved
+
+        # Column 46 (AT): Lookup Division from DivisionNo
         if not division_entry:
             error_msg = f"Missing Division mapping for DivisionNo '{division_no}' in Sale_No {row_dict.get('Sale_No', 'Unknown')}"
             logger.error(error_msg)
             mapping_errors.append(error_msg)
-        
-        new_row['Division Name'] = division_entry.get("Division", "") if division_entry else ""
+        row_dict['Division Name'] = division_name
 
         # Column 43 (AQ): Concatenate State and Division Name
-        state_val = row_dict.get('State') or ""
-        new_row['State-Division Name'] = f"{state_val}-{new_row['Division Name']}" if state_val and new_row['Division Name'] else ""
+        row_dict['State-Division Name'] = state_division
 
         # Column 44 (AR): Lookup Payment Days
-        state_division = new_row['State-Division Name']
-        state_days_entry = next((item for item in division_state_days 
-                               if f"{item.get('State')}-{item.get('Division Name')}" == state_division), None)
         if not state_days_entry and state_division:
             error_msg = f"Missing Payment Days mapping for State-Division '{state_division}' in Sale_No {row_dict.get('Sale_No', 'Unknown')}"
             logger.error(error_msg)
             mapping_errors.append(error_msg)
         
-        new_row['Payment Days'] = state_days_entry.get("Days", "") if state_days_entry else ""
+        payment_days = state_days_entry.get("Days", "") if state_days_entry else ""
+        row_dict['Payment Days'] = payment_days
 
         # Column 45 (AS): Calculate Due Date
         sale_date = row_dict.get('Sale_Date')
-        payment_days = new_row['Payment Days']
-        if isinstance(sale_date, datetime) and isinstance(payment_days, int):
-            new_row['Due Date'] = sale_date + timedelta(days=payment_days)
+        # Type checks used by more than one column are done once
+        has_sale_date = isinstance(sale_date, datetime)
+        if has_sale_date and isinstance(payment_days, int):
+            row_dict['Due Date'] = sale_date + timedelta(days=payment_days)
         else:
-            new_row['Due Date'] = ""
+            row_dict['Due Date'] = ""
 
         # Column 47 (AU): Lookup Sub Division
-        division = new_row['Division Name']
-        subdivision_entry = next((item for item in division_to_subdivision 
-                                if item.get("Division") == division), None)
-        if not subdivision_entry and division:
-            error_msg = f"Missing Sub Division mapping for Division '{division}' in Sale_No {row_dict.get('Sale_No', 'Unknown')}"
+        if not subdivision_entry and division_name:
+            error_msg = f"Missing Sub Division mapping for Division '{division_name}' in Sale_No {row_dict.get('Sale_No', 'Unknown')}"
             logger.error(error_msg)
             mapping_errors.append(error_msg)
         
-        new_row['Sub Division Name'] = subdivision_entry.get("Sub Division", "") if subdivision_entry else ""
+        row_dict['Sub Division Name'] = subdivision_entry.get("Sub Division", "") if subdivision_entry else ""
 
         # Column 48 (AV): Compute Gross Amount
-        delot_ind = str(row_dict.get('Delot_Ind', "")).upper() == "TRUE"
+        # Delot_Ind is imported as a boolean field, so it is already True, False or None
+        delot_ind = row_dict.get('Delot_Ind') is True
         gross_tot = row_dict.get('Gross_Tot')
         sale_no = row_dict.get('Sale_No')
         
-        if delot_ind and isinstance(gross_tot, (int, float)) and isinstance(sale_no, (int, float)):
+        if not isinstance(gross_tot, (int, float)):
+            current_gross_amount_num = 0.0
+        elif delot_ind and isinstance(sale_no, (int, float)):
             current_gross_amount_num = float(gross_tot - sale_no)
-        elif isinstance(gross_tot, (int, float)):
-            current_gross_amount_num = float(gross_tot)
         else:
-            current_gross_amount_num = 0.0
-        new_row['Gross Amount'] = current_gross_amount_num
+            current_gross_amount_num = float(gross_tot)
+        row_dict['Gross Amount'] = current_gross_amount_num
 
         # Column 50 (AX): Get To be Collected
-        day_num = reporting_date.day
-        day_key = f"Day{day_num}"
         source_tbc_val = row_dict.get(day_key, None)
         numeric_to_be_collected = float(source_tbc_val) if isinstance(source_tbc_val, (int, float)) else 0.0
-        new_row['To be Collected'] = numeric_to_be_collected
+        row_dict['To be Collected'] = numeric_to_be_collected
 
         # Column 49 (AW): Calculate Collected
-        new_row['Collected'] = current_gross_amount_num - numeric_to_be_collected
+        row_dict['Collected'] = current_gross_amount_num - numeric_to_be_collected
 
         # Column 51 (AY): Compute Payable to Vendor
         payable_to_vendor_val_num = 0.0
         if delot_ind and numeric_to_be_collected == 0.0:
             payable_to_vendor_val_num = current_gross_amount_num
-        new_row['Payable to Vendor'] = payable_to_vendor_val_num
-
-        # Column 52 (AZ): Format Month
-        if row_dict.get('Description') and isinstance(sale_date, datetime):
-            new_row['Month'] = sale_date.strftime("%b-%y")
-        else:
-            new_row['Month'] = ""
+        row_dict['Payable to Vendor'] = payable_to_vendor_val_num
 
-        # Column 53 (BA): Extract Year
-        if row_dict.get('Description') and isinstance(sale_date, datetime):
-            new_row['Year'] = sale_date.year
+        # Columns 52 (AZ) and 53 (BA): Format Month and extract Year
+        if has_sale_date and row_dict.get('Description'):
+            row_dict['Month'] = sale_date.strftime("%b-%y")
+            row_dict['Year'] = sale_date.year
         else:
-            new_row['Year'] = ""
+            row_dict['Month'] = ""
+            row_dict['Year'] = ""
 
         # Column 54 (BB): Cheque Date Y/N
-        new_row['Cheque Date Y/N'] = "YES" if row_dict.get('Cheque_Date') else "NO"
+        cheque_date_val = row_dict.get('Cheque_Date')
+        row_dict['Cheque Date Y/N'] = "YES" if cheque_date_val else "NO"
 
         # Column 55 (BC): Compute days late
-        try:
-            if new_row['Payable to Vendor'] == row_dict.get('Gross_Tot'):
-                cheque_date_val = row_dict.get('Cheque_Date')
-                if isinstance(cheque_date_val, datetime):
-                    days_diff = (reporting_date.date() - cheque_date_val.date()).days
-                    new_row['Days Late for Vendors Pmt'] = days_diff if days_diff > 0 else ''
-                else:
-                    new_row['Days Late for Vendors Pmt'] = ''
-            else:
-                new_row['Days Late for Vendors Pmt'] = ''
-        except:
-            new_row['Days Late for Vendors Pmt'] = ''
-
-    def _create_excel_reports(self, processed_data: List[Dict[str, Any]], mapping_file: 'FileModel', 
+        # Operands are type-checked up front, so no exception handling is needed here
+        row_dict['Days Late for Vendors Pmt'] = ''
+        if payable_to_vendor_val_num == gross_tot and isinstance(cheque_date_val, datetime):
+            days_diff = (reporting_day - cheque_date_val.date()).days
+            if days_diff > 0:
+                row_dict['Days Late for Vendors Pmt'] = days_diff
+
+    def _create_excel_reports(self, processed_data: List[Dict[str, Any]], tables_rows: List[List[str]], 
                              date_str: str, reporting_date: datetime, errors: List[str]) -> 'FileModel':
         """
         Creates Excel reports and packages them into a ZIP file.
         
         Args:
             processed_data: Transformed data ready for export
-            mapping_file: Original mapping file for Tables sheet
+            tables_rows: Parsed mapping file rows for the Tables sheet
             date_str: Formatted date string for filenames
             reporting_date: Date for conditional formatting
             errors: List to append any export errors
@@ -520,12 +601,11 @@ class AgingReportService:
         logger.info(f"Creating Excel reports for {len(processed_data)} rows")
 
         # Create main workbook with Tables sheet
-        template_wb = openpyxl.Workbook()
-        if template_wb.active:
-            template_wb.remove(template_wb.active)
+        # Write-only workbooks stream rows to XML instead of keeping every cell in memory
+        template_wb = openpyxl.Workbook(write_only=True)
 
         # Add Tables sheet with mapping data
-        self._create_tables_sheet(template_wb, mapping_file)
+        self._create_tables_sheet(template_wb, tables_rows)
 
         # Export main data
         errors_export = []
@@ -537,7 +617,8 @@ class AgingReportService:
 
         # Create ZIP file with all reports
         zip_output = io.BytesIO()
-        with zipfile.ZipFile(zip_output, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        # .xlsx files are already deflate-compressed ZIP packages, so store them as is
+        with zipfile.ZipFile(zip_output, 'w', zipfile.ZIP_STORED) as zipf:
             # Add main Excel file
             output = io.BytesIO()
             template_wb.save(output)
@@ -553,18 +634,14 @@ class AgingReportService:
         logger.info(f"Created ZIP file '{zip_file_name}' with all reports")
         return FileModel(name=zip_file_name, content=zip_output.getvalue())
 
-    def _create_tables_sheet(self, workbook: openpyxl.Workbook, mapping_file: 'FileModel') -> None:
+    def _create_tables_sheet(self, workbook: openpyxl.Workbook, tables_rows: List[List[str]]) -> None:
         """Creates the Tables sheet with mapping data."""
         tables_sheet = workbook.create_sheet(title='Tables')
         logger.debug("Added 'Tables' sheet to output workbook")
 
-        tables_data_str = mapping_file.content.decode('utf-8')
-        tables_data_csv = csv.reader(io.StringIO(tables_data_str))
-        tables_data_rows = list(tables_data_csv)
-
-        for row_idx, row in enumerate(tables_data_rows, 1):
-            for col_idx, value in enumerate(row, 1):
-                tables_sheet.cell(row=row_idx, column=col_idx).value = value
+        # Append whole rows instead of addressing every cell individually
+        for row in tables_rows:
+            tables_sheet.append(row)
 
     def _create_filtered_reports(self, zipf: zipfile.ZipFile, processed_data: List[Dict[str, Any]], 
                                 date_str: str, reporting_date: datetime, errors: List[str]) -> None:
@@ -586,9 +663,7 @@ class AgingReportService:
             logger.info(f"Filtered {len(filtered_data)} rows for {report_type}")
 
             # Create workbook
-            report_wb = openpyxl.Workbook()
-            if report_wb.active:
-                report_wb.remove(report_wb.active)
+            report_wb = openpyxl.Workbook(write_only=True)
 
             # Create sheets
             errors_export = []
@@ -652,13 +727,30 @@ class AgingReportService:
             date_str = reporting_date.strftime("%Y%m%d")
             logger.debug(f"Processing date: {reporting_date}, formatted as {date_str}")
 
+            # Reject an empty mapping file up front; its loader only reports back
+            # after every data file has been parsed alongside it
+            if not mapping_file.content.strip():
+                error_msg = f"Mapping file {mapping_file.name} is empty."
+                logger.error(error_msg)
+                errors.append(error_msg)
+                self._handle_errors(errors, response)
+                return response
+
             # Step 1: Validate files and extract state information
             valid_file_info = self._validate_and_extract_file_info(data_files, errors)
             if self._handle_errors(errors, response):
                 return response
 
-            # Step 2: Load and filter data from all files
-            all_filtered_data = self._load_and_filter_data_files(valid_file_info, errors)
+            # Steps 2 and 3: Load and filter the data files and load the mapping file.
+            # The two are independent until the transform step, so parse them concurrently.
+            data_errors: List[str] = []
+            mapping_errors: List[str] = []
+            all_filtered_data, mapping_data = await asyncio.gather(
+                asyncio.to_thread(self._load_and_filter_data_files, valid_file_info, data_errors),
+                asyncio.to_thread(self._load_and_process_mapping_file, mapping_file, mapping_errors),
+            )
+
+            errors.extend(data_errors)
             if self._handle_errors(errors, response):
                 return response
 
@@ -669,19 +761,26 @@ class AgingReportService:
                 self._handle_errors(errors, response)
                 return response
 
-            # Step 3: Load mapping file
-            mapping_data = self._load_and_process_mapping_file(mapping_file, errors)
+            errors.extend(mapping_errors)
             if mapping_data is None:
                 self._handle_errors(errors, response)
                 return response
 
+            # The raw mapping rows come back with the lookups and are reused for the Tables sheet
+            lookup_data, tables_rows = mapping_data[:3], mapping_data[3]
+
+            # Steps 4 and 5 are CPU-bound too, so they also run in a worker thread
+            # to keep the event loop free for other requests
+
             # Step 4: Transform data with computed columns
-            transformed_data = self._transform_data_rows(all_filtered_data, mapping_data, reporting_date, errors)
+            transformed_data = await asyncio.to_thread(
+                self._transform_data_rows, all_filtered_data, lookup_data, reporting_date, errors)
             if self._handle_errors(errors, response):
                 return response
 
             # Step 5: Create Excel reports and ZIP file
-            result_file = self._create_excel_reports(transformed_data, mapping_file, date_str, reporting_date, errors)
+            result_file = await asyncio.to_thread(
+                self._create_excel_reports, transformed_data, tables_rows, date_str, reporting_date, errors)
             if self._handle_errors(errors, response):
                 return response
 
@@ -692,9 +791,9 @@ class AgingReportService:
 
         except Exception as e:
             # Log the error and return error response
-            end_time = time.time() - method_start_time
+            elapsed = time.time() - method_start_time
             error_message = f"Error processing file: {str(e)}"
-            logger.error(error_message, exc_info=True)
+            logger.error(f"{error_message} (failed after {elapsed:.3f}s)", exc_info=True)
             errors.append(error_message)
             self._handle_errors(errors, response)
             return response
@@ -1,6 +1,6 @@
 import io
-import itertools
 import csv
+import logging
 import zipfile
 from typing import List, Dict, Any, Optional
 from decimal import Decimal
@@ -22,7 +22,7 @@ class BankStatementService:
     """
 
     # Hardcoded configuration
-    REQUIRED_ACCOUNTS = [
+    REQUIRED_ACCOUNTS = frozenset({
         "032075843041",
         "030162001011700001",
         "034003431178",
@@ -31,7 +31,7 @@ class BankStatementService:
         "034702307846",
         "032075840422",
         "036011606934"
-    ]
+    })
     
     REQUIRED_CSV_COLUMNS = [
         "TRAN_DATE",
@@ -51,6 +51,12 @@ class BankStatementService:
         "CLOSING_BAL"
     ]
 
+    # Rows are kept as lists in REQUIRED_CSV_COLUMNS order, so columns are read by position
+    IDX_TRAN_DATE = REQUIRED_CSV_COLUMNS.index("TRAN_DATE")
+    IDX_ACCOUNT_NO = REQUIRED_CSV_COLUMNS.index("ACCOUNT_NO")
+    NUMERIC_COLUMN_INDICES = tuple(map(REQUIRED_CSV_COLUMNS.index, NUMERIC_COLUMNS))
+    _numeric_columns = tuple(zip(NUMERIC_COLUMNS, NUMERIC_COLUMN_INDICES))
+
     def __init__(self):
         pass
 
@@ -97,9 +103,9 @@ class BankStatementService:
         logger.info("CSV file validation passed")
         return True
 
-    def _load_csv_data(self, csv_file: FileModel, errors: List[str]) -> Optional[List[Dict[str, Any]]]:
+    def _load_csv_data(self, csv_file: FileModel, errors: List[str]) -> Optional[List[List[Any]]]:
         """
-        Loads and parses CSV data into a list of dictionaries.
+        Loads and parses CSV data into a list of rows.
         Validates headers match expected columns.
         
         Args:
@@ -107,17 +113,17 @@ class BankStatementService:
             errors: List to append validation errors
             
         Returns:
-            List of dictionaries representing rows, or None if validation fails
+            List of rows with values in REQUIRED_CSV_COLUMNS order, or None if validation fails
         """
         logger.info(f"Loading CSV data from {csv_file.name}")
         
         try:
             # Decode CSV content (handle BOM if present)
             text = csv_file.content.decode('utf-8-sig')
-            reader = csv.DictReader(io.StringIO(text))
+            reader = csv.reader(io.StringIO(text))
             
             # Get headers from the CSV
-            headers = reader.fieldnames
+            headers = next(reader, None)
             if headers is None:
                 error_msg = "CSV file has no headers"
                 logger.error(error_msg)
@@ -137,13 +143,19 @@ class BankStatementService:
                 return None
             
             # Read all rows
+            column_count = len(headers)
             data = []
             row_count = 0
             for row in reader:
+                if not row:
+                    # Blank line
+                    continue
                 row_count += 1
-                # Create dictionary with cleaned values
-                row_dict = {col: row.get(col, "").strip() if row.get(col) else "" for col in headers}
-                data.append(row_dict)
+                # Clean values; short rows are padded with "" and extra fields are dropped
+                row_values = [value.strip() for value in row[:column_count]]
+                if len(row_values) < column_count:
+                    row_values.extend([""] * (column_count - len(row_values)))
+                data.append(row_values)
             
             logger.info(f"Data loaded successfully. Total rows: {row_count}")
             return data
@@ -154,186 +166,133 @@ class BankStatementService:
             errors.append(error_msg)
             return None
 
-    def _filter_by_accounts(self, data: List[Dict[str, Any]], errors: List[str]) -> List[Dict[str, Any]]:
+    def _convert_numeric_columns(self, row: List[Any]) -> int:
         """
-        Filters transactions for required accounts.
+        Converts the numeric columns of a row to Decimal in place.
         
         Args:
-            data: List of transaction dictionaries
-            errors: List to append errors (currently unused but kept for consistency)
+            row: Transaction row
             
         Returns:
-            Filtered list of transactions
+            Number of values that could not be converted
         """
-        logger.info(f"Filtering data for required accounts: {self.REQUIRED_ACCOUNTS}")
-        logger.info(f"Original data size: {len(data)}")
-        
-        filtered_data = [row for row in data if row.get('ACCOUNT_NO', '') in self.REQUIRED_ACCOUNTS]
-        
-        logger.info(f"Filtered data size: {len(filtered_data)}")
-        return filtered_data
+        conversion_errors = 0
+        for col, idx in self._numeric_columns:
+            value = row[idx]
+            if not value:
+                continue
+            try:
+                # Values are already stripped strings from the CSV, so no str() round trip
+                row[idx] = Decimal(value)
+            except (ValueError, Exception) as e:
+                logger.warning(f"Failed to convert {col} value '{value}' to Decimal: {str(e)}")
+                conversion_errors += 1
+                # Keep original value if conversion fails
+        return conversion_errors
 
-    def _convert_numeric_columns(self, data: List[Dict[str, Any]], errors: List[str]) -> List[Dict[str, Any]]:
+    def _filter_and_group(self, data: List[List[Any]], errors: List[str]) -> Dict[str, Dict[str, List[List[Any]]]]:
         """
-        Converts numeric columns to Decimal.
+        Filters transactions for required accounts, converts numeric columns to Decimal
+        and groups the transactions by date and account in a single pass.
         
         Args:
-            data: List of transaction dictionaries
-            errors: List to append conversion errors
+            data: List of transaction rows
+            errors: List to append errors (currently unused but kept for consistency)
             
         Returns:
-            Data with numeric columns converted
+            Dictionary mapping dates to dictionaries mapping account numbers to their
+            transactions, with dates and accounts in ascending order
         """
+        logger.info(f"Filtering data for required accounts: {sorted(self.REQUIRED_ACCOUNTS)}")
+        logger.info(f"Original data size: {len(data)}")
         logger.info(f"Converting numeric columns: {self.NUMERIC_COLUMNS}")
         
+        required_accounts = self.REQUIRED_ACCOUNTS
+        account_idx = self.IDX_ACCOUNT_NO
+        date_idx = self.IDX_TRAN_DATE
+        
+        date_groups: Dict[str, Dict[str, List[List[Any]]]] = {}
+        filtered_count = 0
         conversion_errors = 0
         for row in data:
-            for col in self.NUMERIC_COLUMNS:
-                value = row.get(col, '')
-                if value:
-                    try:
-                        row[col] = Decimal(str(value))
-                    except (ValueError, Exception) as e:
-                        logger.warning(f"Failed to convert {col} value '{value}' to Decimal: {str(e)}")
-                        conversion_errors += 1
-                        # Keep original value if conversion fails
-        
+            if row[account_idx] not in required_accounts:
+                continue
+            filtered_count += 1
+            conversion_errors += self._convert_numeric_columns(row)
+            # Group on the converted date, as the output file names use it
+            date_groups.setdefault(str(row[date_idx]), {}).setdefault(str(row[account_idx]), []).append(row)
+        
+        logger.info(f"Filtered data size: {filtered_count}")
         if conversion_errors > 0:
             logger.warning(f"Encountered {conversion_errors} conversion errors")
         
-        return data
-
-    def _group_by_date(self, data: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
-        """
-        Groups transactions by transaction date.
-        
-        Args:
-            data: List of transaction dictionaries
-            
-        Returns:
-            Dictionary mapping dates to lists of transactions
-        """
-        logger.info("Grouping transactions by date")
+        # Only the group keys need sorting; rows keep their file order within each group
+        sorted_groups = {date: dict(sorted(account_groups.items()))
+                         for date, account_groups in sorted(date_groups.items())}
+        if logger.isEnabledFor(logging.INFO):
+            for date, account_groups in sorted_groups.items():
+                logger.info(f"Date {date}: {sum(len(rows) for rows in account_groups.values())} transactions")
         
-        # Sort by date first (required for itertools.groupby)
-        sorted_data = sorted(data, key=lambda x: str(x.get('TRAN_DATE', '')))
-        
-        # Group by date
-        date_groups = {}
-        for date, group in itertools.groupby(sorted_data, key=lambda x: str(x.get('TRAN_DATE', ''))):
-            date_groups[date] = list(group)
-            logger.info(f"Date {date}: {len(date_groups[date])} transactions")
-        
-        logger.info(f"Grouped into {len(date_groups)} date groups")
-        return date_groups
+        logger.info(f"Grouped into {len(sorted_groups)} date groups")
+        return sorted_groups
 
-    def _create_account_excel(self, account_no: str, date: str, account_data: List[Dict[str, Any]]) -> bytes:
-        """
-        Creates an Excel file for a specific account/date combination.
-        
-        Args:
-            account_no: Account number
-            date: Transaction date
-            account_data: List of transactions for this account/date
-            
-        Returns:
-            Bytes content of the created Excel file
-        """
-        logger.info(f"Creating Excel file for account {account_no}, date {date}")
-        
-        wb = Workbook()
-        wb.remove(wb.active)  # Remove default sheet
-        
-        # Create sheet named by account number
-        ws = wb.create_sheet(title=account_no)
-        
-        # Write headers
-        ws.append(self.REQUIRED_CSV_COLUMNS)
-        
-        # Write data rows
-        for row in account_data:
-            row_values = [row.get(col, '') for col in self.REQUIRED_CSV_COLUMNS]
-            ws.append(row_values)
-        
-        # Save to bytes
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        logger.info(f"Created Excel file with {len(account_data)} rows for account {account_no}, date {date}")
-        return output.getvalue()
+    def _write_workbook_to_zip(self, zipf: zipfile.ZipFile, filename: str, wb: Workbook) -> None:
+        """Saves a workbook straight into a new ZIP archive entry."""
+        with zipf.open(filename, 'w') as entry:
+            wb.save(entry)
+        logger.debug("Added '%s' to ZIP archive", filename)
 
-    def _create_summary_excel(self, date: str, date_data: List[Dict[str, Any]]) -> bytes:
+    def _create_date_excel_files(self, zipf: zipfile.ZipFile, date: str, account_groups: Dict[str, List[List[Any]]]) -> int:
         """
-        Creates a summary Excel file with all accounts for a specific date.
-        Each account gets its own sheet.
+        Creates the Excel files for one date: a file per account, plus a summary file
+        with a sheet per account. Each account's rows are written to both workbooks in
+        the same pass, and each workbook is saved directly into the ZIP archive.
         
         Args:
+            zipf: Open ZIP archive to add the files to
             date: Transaction date
-            date_data: All transactions for this date
+            account_groups: Transactions for this date, grouped by account number
             
         Returns:
-            Bytes content of the created Excel file
+            Number of files added to the archive
         """
-        logger.info(f"Creating summary Excel file for date {date}")
+        logger.info(f"Creating Excel files for date {date}")
         
-        wb = Workbook()
-        wb.remove(wb.active)  # Remove default sheet
+        # Checked once so the per-account messages are only built when they will be emitted
+        info_enabled = logger.isEnabledFor(logging.INFO)
+        file_count = 0
+        headers = self.REQUIRED_CSV_COLUMNS
         
-        # Group by account within this date
-        sorted_by_account = sorted(date_data, key=lambda x: x.get('ACCOUNT_NO', ''))
-        account_groups = itertools.groupby(sorted_by_account, key=lambda x: x.get('ACCOUNT_NO', ''))
+        # Write-only workbooks stream rows out instead of keeping every cell in memory
+        summary_wb = Workbook(write_only=True)
         
-        for account_no, account_data in account_groups:
-            account_data = list(account_data)
-            logger.info(f"Adding sheet for account {account_no} with {len(account_data)} transactions")
-            
-            # Create sheet named by account number
-            ws = wb.create_sheet(title=account_no)
+        for account_no, account_data in account_groups.items():
+            # Sheets are named by account number in both workbooks
+            account_wb = Workbook(write_only=True)
+            account_ws = account_wb.create_sheet(title=account_no)
+            summary_ws = summary_wb.create_sheet(title=account_no)
             
             # Write headers
-            ws.append(self.REQUIRED_CSV_COLUMNS)
+            account_ws.append(headers)
+            summary_ws.append(headers)
             
-            # Write data rows
+            # Write data rows (already in column order)
             for row in account_data:
-                row_values = [row.get(col, '') for col in self.REQUIRED_CSV_COLUMNS]
-                ws.append(row_values)
-        
-        # Save to bytes
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        logger.info(f"Created summary Excel file for date {date}")
-        return output.getvalue()
-
-    def _create_zip_file(self, excel_files: Dict[str, bytes], original_filename: str) -> FileModel:
-        """
-        Creates a ZIP file containing all the generated Excel files.
-        
-        Args:
-            excel_files: Dictionary mapping filenames to file content bytes
-            original_filename: Original filename (without extension)
+                account_ws.append(row)
+                summary_ws.append(row)
             
-        Returns:
-            FileModel containing the ZIP file
-        """
-        logger.info(f"Creating ZIP file with {len(excel_files)} Excel files")
-        
-        zip_output = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_output, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for filename, content in excel_files.items():
-                zipf.writestr(filename, content)
-                logger.debug(f"Added '{filename}' to ZIP archive")
-        
-        zip_output.seek(0)
-        
-        # Generate ZIP filename
-        zip_filename = f"[pygrays]{original_filename}-BankStatement.zip"
-        logger.info(f"Created ZIP file '{zip_filename}' with {len(excel_files)} files")
-        
-        return FileModel(name=zip_filename, content=zip_output.getvalue())
+            account_filename = f"{account_no}_{date}.xlsx"
+            self._write_workbook_to_zip(zipf, account_filename, account_wb)
+            file_count += 1
+            if info_enabled:
+                logger.info(f"Created individual file: {account_filename} ({len(account_data)} transactions)")
+        
+        summary_filename = f"ALL Westpac Accounts Bank Statements {date}.xlsx"
+        self._write_workbook_to_zip(zipf, summary_filename, summary_wb)
+        file_count += 1
+        logger.info(f"Created summary file: {summary_filename}")
+        
+        return file_count
 
     async def process_uploaded_file(self, csv_file: FileModel) -> ResponseBase:
         """
@@ -370,57 +329,31 @@ class BankStatementService:
                 self._handle_errors(errors, response)
                 return response
             
-            # Step 3: Filter by accounts
-            filtered_data = self._filter_by_accounts(data, errors)
-            
-            if len(filtered_data) == 0:
-                error_msg = "No transactions found for required accounts"
-                logger.error(error_msg)
-                errors.append(error_msg)
-                self._handle_errors(errors, response)
-                return response
-            
-            # Step 4: Convert numeric columns
-            filtered_data = self._convert_numeric_columns(filtered_data, errors)
-            
-            # Step 5: Group by date
-            date_groups = self._group_by_date(filtered_data)
+            # Steps 3-5: Filter by accounts, convert numeric columns and group by date and account
+            date_groups = self._filter_and_group(data, errors)
             
             if len(date_groups) == 0:
-                error_msg = "No date groups found"
+                error_msg = "No transactions found for required accounts"
                 logger.error(error_msg)
                 errors.append(error_msg)
                 self._handle_errors(errors, response)
                 return response
             
-            # Step 6: Create Excel files for each date/account combination
-            excel_files = {}
+            # Steps 6-7: Create Excel files for each date/account combination, saving each
+            # one straight into the ZIP file so only one workbook is buffered at a time
             original_filename = csv_file.name.rsplit('.', 1)[0]  # Remove extension
+            zip_output = io.BytesIO()
+            file_count = 0
             
-            for date, date_data in date_groups.items():
-                logger.info(f"Processing date {date} with {len(date_data)} transactions")
-                
-                # Group by account within this date
-                sorted_by_account = sorted(date_data, key=lambda x: str(x.get('ACCOUNT_NO', '')))
-                account_groups = itertools.groupby(sorted_by_account, key=lambda x: str(x.get('ACCOUNT_NO', '')))
-                
-                for account_no, account_data in account_groups:
-                    account_data = list(account_data)
-                    
-                    # Create individual account file
-                    account_excel = self._create_account_excel(account_no, date, account_data)
-                    account_filename = f"{account_no}_{date}.xlsx"
-                    excel_files[account_filename] = account_excel
-                    logger.info(f"Created individual file: {account_filename}")
-                
-                # Create summary file for this date
-                summary_excel = self._create_summary_excel(date, date_data)
-                summary_filename = f"ALL Westpac Accounts Bank Statements {date}.xlsx"
-                excel_files[summary_filename] = summary_excel
-                logger.info(f"Created summary file: {summary_filename}")
+            # .xlsx files are already deflate-compressed ZIP packages, so store them as is
+            with zipfile.ZipFile(zip_output, 'w', zipfile.ZIP_STORED) as zipf:
+                for date, account_groups in date_groups.items():
+                    file_count += self._create_date_excel_files(zipf, date, account_groups)
             
-            # Step 7: Create ZIP file
-            zip_file = self._create_zip_file(excel_files, original_filename)
+            # Generate ZIP filename
+            zip_filename = f"[pygrays]{original_filename}-BankStatement.zip"
+            logger.info(f"Created ZIP file '{zip_filename}' with {file_count} files")
+            zip_file = FileModel(name=zip_filename, content=zip_output.getvalue())
             
             # Set the data in the response object
             response.data = zip_file
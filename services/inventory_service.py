@@ -1,8 +1,10 @@
+import codecs
 import csv
 import io
 import logging
 import re
-from typing import List, Tuple, Dict, Optional
+from collections import defaultdict
+from typing import Iterator, List, Tuple, Dict, Optional
 from datetime import datetime
 
 from openpyxl import Workbook
@@ -14,7 +16,7 @@ from utils.schema_config import (
     inventory_uom_mapping_schema as inventory_uom_mapping_import_schema,
     inventory_dropship_sales_schema as inventory_dropship_sales_export_schema,
     inventory_mixed_export_schema,
-    inventory_wine_export_schema, BaseSchema
+    inventory_wine_export_schema, BaseSchema, iter_row_values
 )
 
 import decimal
@@ -22,6 +24,18 @@ import decimal
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Input file name patterns, compiled once instead of on every request
+_DEALS_FILE_RE = re.compile(r'^Deals\d{8}\.txt$')
+_DROPSHIP_SALES_FILE_RE = re.compile(r'^DropshipSales\d{8}\.txt$')
+
+# Numeric cell cleanup: ASCII values (the norm) go through str.translate deletion
+# tables; anything else still goes through the Unicode-aware regexes
+_ASCII_NON_DIGITS = ''.join(c for c in map(chr, range(128)) if not c.isdigit())
+_STRIP_NON_DECIMAL_ASCII = str.maketrans('', '', _ASCII_NON_DIGITS.replace('.', ''))
+_STRIP_NON_DIGIT_ASCII = str.maketrans('', '', _ASCII_NON_DIGITS)
+_NON_DECIMAL_RE = re.compile(r'[^\d.]')
+_NON_DIGIT_RE = re.compile(r'\D')
+
 class InventoryService:
     # Use schemas from configuration
     dropship_sales_import_schema = inventory_dropship_sales_import_schema
@@ -35,42 +49,51 @@ class InventoryService:
         pass
 
     @staticmethod
-    def _load_csv_from_bytes(csv_data: bytes) -> list[list[str]]:
-        bio = io.BytesIO(csv_data)
-        
-        # Try different encodings with BOM handling
+    def _iter_csv_from_bytes(csv_data: bytes, delimiter: Optional[str] = None) -> Iterator[List[str]]:
+        """
+        Decode CSV bytes and return a reader that yields the rows lazily.
+
+        The whole payload is decoded up front so that a bad byte anywhere in the
+        file still falls through to the next encoding, but rows are only split
+        into lists as the caller consumes them.
+
+        Args:
+            csv_data: Raw CSV file content.
+            delimiter: Expected field delimiter. When it does not appear in the header
+                line, tab or comma is picked by counting both in the first 4KB.
+
+        Returns:
+            Iterator over the parsed rows, header first.
+        """
+        # Skip a UTF-8 BOM by offset and decode the rest as plain UTF-8, then fall back
+        bom_length = len(codecs.BOM_UTF8) if csv_data.startswith(codecs.BOM_UTF8) else 0
         encodings_to_try = [
-            ('utf-8-sig', 'UTF-8 with BOM handling'),
-            ('utf-8', 'standard UTF-8'),
-            ('latin-1', 'fallback encoding')
+            ('utf-8', 'UTF-8', bom_length),
+            ('latin-1', 'fallback encoding', 0)
         ]
         
         last_error = None
-        for encoding, desc in encodings_to_try:
-            bio.seek(0)
+        for encoding, desc, start in encodings_to_try:
             try:
                 logger.debug(f"Trying to decode with {desc}")
-                text_wrapper = io.TextIOWrapper(bio, encoding=encoding, newline='')
-                sample = text_wrapper.read(4096)
-                if not sample:
+                text = str(memoryview(csv_data)[start:], encoding)
+                if not text:
                     logger.debug(f"Empty sample with {desc}, trying next encoding")
                     continue
-                    
-                text_wrapper.seek(0)
                 
-                try:
-                    dialect = csv.Sniffer().sniff(sample, delimiters=',\t')
-                    logger.debug(f"Successfully sniffed CSV dialect with {desc}")
-                except csv.Error:
-                    logger.debug(f"Could not determine dialect with {desc}, using excel dialect")
-                    dialect = csv.excel
+                first_line_end = text.find('\n')
+                header_line = text if first_line_end == -1 else text[:first_line_end]
+                if not (delimiter and delimiter in header_line):
+                    # Unexpected layout: take whichever of tab or comma dominates the sample
+                    sample = text[:4096]
+                    delimiter = '\t' if sample.count('\t') > sample.count(',') else ','
+                    logger.debug(f"Detected {delimiter!r} delimiter with {desc}")
     
-                reader = csv.reader(text_wrapper, dialect=dialect)
-                rows = list(reader)
-                if rows:
-                    logger.debug(f"Successfully read {len(rows)} rows with {desc}")
-                    return rows
-                logger.debug(f"No rows read with {desc}, trying next encoding")
+                if '"' not in text:
+                    # Without quote characters every field boundary is a delimiter, so
+                    # plain splitting gives the same rows as csv.reader, only cheaper
+                    return InventoryService._split_lines(text, delimiter)
+                return csv.reader(io.StringIO(text, newline=''), dialect=csv.excel, delimiter=delimiter)
             except Exception as e:
                 last_error = e
                 logger.debug(f"Error with {desc}: {str(e)}")
@@ -81,6 +104,23 @@ class InventoryService:
         logger.error(error_msg)
         raise ValueError(error_msg)
 
+    @staticmethod
+    def _split_lines(text: str, delimiter: str) -> Iterator[List[str]]:
+        """
+        Split quote-free CSV text into rows the same way csv.reader would.
+        
+        Args:
+            text: Decoded CSV content without any quote characters.
+            delimiter: Field delimiter.
+            
+        Returns:
+            Iterator over the rows; blank lines yield an empty list.
+        """
+        # newline='' splits on \r, \n and \r\n only, like csv.reader, and keeps the endings
+        for line in io.StringIO(text, newline=''):
+            line = line.rstrip('\r\n')
+            yield line.split(delimiter) if line else []
+
     @staticmethod
     def _extract_and_validate_file_dates(file_names: List[str]) -> Tuple[Optional[int], Optional[int], bool]:
         """
@@ -105,14 +145,15 @@ class InventoryService:
             # decompose file name
             # E.g., DropshipSales20250228.txt will be decomposed into Category: DropshipSales, Date: 20250228, Extension: txt
     
-            pattern = r'^(.+)(\d{8})\.([a-zA-Z]+)$'
-            match = re.match(pattern, file_name)
-            if not match:
+            # The extension has no dots, so the date always sits right before the last one
+            dot = file_name.rfind('.')
+            if dot < 9:
                 return None, None, False
     
-            category = match.group(1)  # Group 1: Category
-            date = match.group(2)  # Group 2: Date
-            extension = match.group(3)  # Group 3: Extension
+            date = file_name[dot - 8:dot]  # Date
+            extension = file_name[dot + 1:]  # Extension
+            if not (date.isdecimal() and extension.isascii() and extension.isalpha()):
+                return None, None, False
     
             # Get month and year from date
             month = int(date[4:6])
@@ -218,6 +259,8 @@ class InventoryService:
         """
         items_not_found = []
         lookup_stats = {}
+        # Unpack the file entries once rather than indexing them for every item
+        soh_mappings = [(file_data['filename'], file_data['mapping']) for file_data in soh_files_data]
         
         for item in data_dicts:
             product_code = item.get("AX_ProductCode", "")
@@ -225,10 +268,10 @@ class InventoryService:
             found_in_file = None
             
             # Try to find the item in SOH files (newest first)
-            for file_data in soh_files_data:
-                if product_code in file_data['mapping']:
-                    per_unit_cost = file_data['mapping'][product_code]
-                    found_in_file = file_data['filename']
+            for filename, mapping in soh_mappings:
+                if product_code in mapping:
+                    per_unit_cost = mapping[product_code]
+                    found_in_file = filename
                     break
             
             if found_in_file:
@@ -339,16 +382,14 @@ class InventoryService:
             Prepared Workbook object or None if error occurs.
         """
         try:
-            new_workbook = Workbook()
+            # Write-only mode streams rows out instead of keeping a Cell per value;
+            # it also starts without a default sheet
+            new_workbook = Workbook(write_only=True)
             
             # Create sheets for data
-            dropship_sales_sheet = new_workbook.create_sheet("Dropship Sales")
-            mixed_sheet = new_workbook.create_sheet("Mixed")
-            wine_sheet = new_workbook.create_sheet("Wine")
-            
-            # Remove the default sheet if it exists
-            if 'Sheet' in new_workbook.sheetnames:
-                del new_workbook['Sheet']
+            new_workbook.create_sheet("Dropship Sales")
+            new_workbook.create_sheet("Mixed")
+            new_workbook.create_sheet("Wine")
             
             return new_workbook
         except Exception as e:
@@ -372,17 +413,9 @@ class InventoryService:
             sheet = workbook['Dropship Sales']
             headers = list(self.dropship_sales_export_schema.schema.keys())
             sheet.append(headers)
-            for item in data_dicts:
-                row_values = []
-                for col in headers:
-                    value = item.get(col, '')
-                    if isinstance(value, decimal.Decimal):
-                        try:
-                            value = value.quantize(decimal.Decimal('0.01'), rounding=decimal.ROUND_HALF_UP)
-                        except (decimal.InvalidOperation, TypeError):
-                            value = ''
-                    row_values.append(value)
-                sheet.append(row_values)
+            append_row = sheet.append
+            for row_values in iter_row_values(headers, data_dicts):
+                append_row(row_values)
             logger.info(f'Wrote {len(data_dicts)} rows to Dropship Sales sheet')
             return True
         except Exception as e:
@@ -406,17 +439,9 @@ class InventoryService:
             sheet = workbook['Mixed']
             headers = list(self.mixed_export_schema.schema.keys())
             sheet.append(headers)
-            for item in mixed_deals:
-                row_values = []
-                for col in headers:
-                    value = item.get(col, '')
-                    if isinstance(value, decimal.Decimal):
-                        try:
-                            value = value.quantize(decimal.Decimal('0.01'), rounding=decimal.ROUND_HALF_UP)
-                        except (decimal.InvalidOperation, TypeError):
-                            value = ''
-                    row_values.append(value)
-                sheet.append(row_values)
+            append_row = sheet.append
+            for row_values in iter_row_values(headers, mixed_deals):
+                append_row(row_values)
             logger.info(f'Wrote {len(mixed_deals)} rows to Mixed sheet')
             return True
         except Exception as e:
@@ -440,17 +465,9 @@ class InventoryService:
             sheet = workbook['Wine']
             headers = list(self.wine_export_schema.schema.keys())
             sheet.append(headers)
-            for item in data_dicts:
-                row_values = []
-                for col in headers:
-                    value = item.get(col, '')
-                    if isinstance(value, decimal.Decimal):
-                        try:
-                            value = value.quantize(decimal.Decimal('0.01'), rounding=decimal.ROUND_HALF_UP)
-                        except (decimal.InvalidOperation, TypeError):
-                            value = ''
-                    row_values.append(value)
-                sheet.append(row_values)
+            append_row = sheet.append
+            for row_values in iter_row_values(headers, data_dicts):
+                append_row(row_values)
             logger.info(f'Wrote {len(data_dicts)} rows to Wine sheet')
             return True
         except Exception as e:
@@ -458,7 +475,7 @@ class InventoryService:
             logger.error('Error writing to Wine sheet', exc_info=True)
             return False
 
-    def _load_csv_data(self, file: FileModel, schema :BaseSchema , errors: List[str]) -> List[Dict]:
+    def _load_csv_data(self, file: FileModel, schema :BaseSchema , errors: List[str], delimiter: Optional[str] = None) -> List[Dict]:
         """
         Load and validate CSV data based on a given schema.
     
@@ -466,17 +483,18 @@ class InventoryService:
             file: The CSV file to process.
             schema: Dictionary mapping column names to expected data types.
             errors: List to collect error messages.
+            delimiter: Expected field delimiter, or None to detect tab or comma.
     
         Returns:
             List of validated row dictionaries. Empty if validation fails.
         """
         try:
-            rows = self._load_csv_from_bytes(file.content)
-            if not rows:
+            rows = self._iter_csv_from_bytes(file.content, delimiter)
+            headers = next(rows, None)
+            if headers is None:
                 errors.append(f'No data in file {file.name}')
                 return []
 
-            headers = rows[0]
             schema_dict = schema.schema if hasattr(schema, 'schema') else {}
             missing_columns = [col for col in schema_dict.keys() if col not in headers]
             if missing_columns:
@@ -485,38 +503,50 @@ class InventoryService:
                 return []
 
             validated_rows = []
+            # Resolve the positions of the typed columns once; the rest are copied as-is
+            typed_columns = []
+            for index, header_name in enumerate(headers):
+                expected_type = getattr(schema_dict[header_name], 'field_type', None) if header_name in schema_dict else None
+                if expected_type in ('decimal', 'integer'):
+                    typed_columns.append((index, header_name, expected_type == 'decimal'))
+            column_count = len(headers)
 
-            for row_index, row in enumerate(rows[1:], start=2):  # Skip header
-                if len(row) != len(headers):
+            for row_index, row in enumerate(rows, start=2):  # Header already consumed
+                if len(row) != column_count:
                     errors.append(f'Row {row_index} in {file.name}: mismatched number of columns')
                     continue
 
-                item = {}
+                item = dict(zip(headers, row))
                 row_invalid = False
-                for i, header_name in enumerate(headers):
-                    value = row[i] if i < len(row) else ''
-                    if header_name in schema_dict:
-                        expected_type = schema_dict[header_name].field_type if hasattr(schema_dict[header_name], 'field_type') else None
-                        if value and expected_type:
-                            if expected_type == 'decimal':
-                                try:
-                                    # remove anything but digits and decimal point from the string
-                                    value = re.sub(r'[^\d.]', '', value)
-                                    value = decimal.Decimal(value)
-                                except decimal.InvalidOperation:
-                                    errors.append(f'Row {row_index}, column \'{header_name}\' in {file.name}: invalid decimal value \'{value}\'')
-                                    row_invalid = True
-                                    break  # Skip this row
-                            elif expected_type == 'integer':
-                                try:
-                                    # remove anything but digits from the string
-                                    value = re.sub(r'\D', '', value)
-                                    value = int(value) if value else 0
-                                except ValueError:
-                                    errors.append(f'Row {row_index}, column \'{header_name}\' in {file.name}: invalid integer value \'{value}\'')
-                                    row_invalid = True
-                                    break  # Skip this row
-                    item[header_name] = value
+                for index, header_name, is_decimal in typed_columns:
+                    value = row[index]
+                    if value:
+                        if is_decimal:
+                            # remove anything but digits and decimal point from the string
+                            if value.isascii():
+                                value = value.translate(_STRIP_NON_DECIMAL_ASCII)
+                            else:
+                                value = _NON_DECIMAL_RE.sub('', value)
+                            # Only digits and dots are left, so this is a valid Decimal exactly
+                            # when it has at least one digit and at most one dot
+                            if not value.replace('.', '', 1).isdigit():
+                                errors.append(f'Row {row_index}, column \'{header_name}\' in {file.name}: invalid decimal value \'{value}\'')
+                                row_invalid = True
+                                break  # Skip this row
+                            value = decimal.Decimal(value)
+                        else:
+                            try:
+                                # remove anything but digits from the string
+                                if value.isascii():
+                                    value = value.translate(_STRIP_NON_DIGIT_ASCII)
+                                else:
+                                    value = _NON_DIGIT_RE.sub('', value)
+                                value = int(value) if value else 0
+                            except ValueError:
+                                errors.append(f'Row {row_index}, column \'{header_name}\' in {file.name}: invalid integer value \'{value}\'')
+                                row_invalid = True
+                                break  # Skip this row
+                        item[header_name] = value
                 if not row_invalid:
                     validated_rows.append(item)
 
@@ -557,25 +587,17 @@ class InventoryService:
             logger.info(f"Loading SOH file: {csv_file.name}")
             
             # Load CSV data
-            rows = self._load_csv_data(csv_file, self.uom_mapping_import_schema, errors)
+            rows = self._load_csv_data(csv_file, self.uom_mapping_import_schema, errors, delimiter=',')
             if errors:
                 logger.error(f"Errors loading SOH file {csv_file.name}: {errors}")
                 return None
             
-            # Build item mapping for this file
-            item_uom_map = {}
-            conflicting_items = {}
-            
+            # Collect the distinct UOM values of each item in first-seen order
+            # (dict keys rather than a set so the conflict message is stable)
+            item_uoms = defaultdict(dict)
             for row in rows:
-                item_number = row["Item"]
-                uom = row["UOM"]
-                if item_number in item_uom_map:
-                    if item_uom_map[item_number] != uom:
-                        if item_number not in conflicting_items:
-                            conflicting_items[item_number] = [item_uom_map[item_number]]
-                        conflicting_items[item_number].append(uom)
-                else:
-                    item_uom_map[item_number] = uom
+                item_uoms[row["Item"]][row["UOM"]] = None
+            conflicting_items = {item: list(uoms) for item, uoms in item_uoms.items() if len(uoms) > 1}
             
             # Check for conflicts within this file
             if conflicting_items:
@@ -589,6 +611,8 @@ class InventoryService:
                 errors.extend(conflict_errors)
                 return None
             
+            item_uom_map = {item: next(iter(uoms)) for item, uoms in item_uoms.items()}
+            
             # Extract date and store file data
             file_date = self._extract_date_from_soh_filename(csv_file.name)
             soh_files_data.append({
@@ -624,7 +648,7 @@ class InventoryService:
         """
         logger.info("Processing Deals files")
     
-        deals_files = sorted([x for x in txt_files if re.match(r'^Deals\d{8}\.txt$', x.name)],
+        deals_files = sorted([x for x in txt_files if _DEALS_FILE_RE.match(x.name)],
                               key=lambda x: x.name)
         
         if not deals_files:
@@ -639,7 +663,7 @@ class InventoryService:
     
         all_items = []
         for file in deals_files:
-            items = self._load_csv_data(file, self.deals_import_schema, errors)
+            items = self._load_csv_data(file, self.deals_import_schema, errors, delimiter='\t')
             if len(errors) > 0:
                 logger.error(f"Errors processing {file.name}: {errors}")
                 return None, None, None
@@ -664,7 +688,7 @@ class InventoryService:
         """
         logger.info("Processing DropshipSales files")
     
-        dropship_sales_files = sorted([x for x in txt_files if re.match(r'^DropshipSales\d{8}\.txt$', x.name)],
+        dropship_sales_files = sorted([x for x in txt_files if _DROPSHIP_SALES_FILE_RE.match(x.name)],
                                       key=lambda x: x.name)
         
         if not dropship_sales_files:
@@ -679,7 +703,7 @@ class InventoryService:
     
         all_items = []
         for file in dropship_sales_files:
-            items = self._load_csv_data(file, self.dropship_sales_import_schema, errors)
+            items = self._load_csv_data(file, self.dropship_sales_import_schema, errors, delimiter='\t')
             if len(errors) > 0:
                 logger.error(f"Errors processing {file.name}: {errors}")
                 return None, None, None
@@ -752,7 +776,7 @@ class InventoryService:
         # Validate both types of files have the same month and year
         if dropship_month is not None and deals_month is not None:
             if dropship_month != deals_month or dropship_year != deals_year:
-                error_msg = f"Files from different periods: DropshipSales files are from {self._get_month_name(dropship_month)} 20{dropship_year}, while Deals files are from {self._get_month_name(deals_month)} 20{deals_year}"
+                error_msg = f"Files from different periods: DropshipSales files are from {self._get_month_name(dropship_month)} {dropship_year}, while Deals files are from {self._get_month_name(deals_month)} {deals_year}"
                 errors.append(error_msg)
                 logger.error(error_msg)
                 self._handle_errors(errors, response)
@@ -1,53 +1,156 @@
 # Schema Configurations for PyGrays API
 
-from typing import Dict, List, Any, Type, Optional, Union, Callable
+from typing import Dict, List, Any, Type, Optional, Union, Callable, Iterable, Iterator
 import csv
+import functools
 import io
 import logging
+import operator
 import re
 from datetime import datetime, timedelta
 import decimal
 from openpyxl import Workbook, worksheet
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import PatternFill
 
 logger = logging.getLogger(__name__)
 
+# Strings treated as True by boolean import fields (compared case-insensitively)
+_TRUE_STRINGS = frozenset({'TRUE', 'YES', 'Y', '1'})
+
+def _parse_dmy_fast(date_string: str, fmt: str) -> Optional[datetime]:
+    """Slice-based parser for the zero-padded dd/mm/yyyy formats used by the report exports.
+
+    Returns None when the string does not have the exact shape of the format, in which
+    case the caller falls back to strptime; a non-None result always equals strptime's.
+    """
+    length = len(date_string)
+    if length < 10 or not date_string.isascii() or date_string[2] != '/' or date_string[5] != '/':
+        return None
+    day, month, year = date_string[0:2], date_string[3:5], date_string[6:10]
+    try:
+        if fmt == '%d/%m/%Y':
+            if length == 10 and (day + month + year).isdigit():
+                return datetime(int(year), int(month), int(day))
+        elif fmt == '%d/%m/%Y %H:%M':
+            hour, minute = date_string[11:13], date_string[14:16]
+            if (length == 16 and date_string[10] == ' ' and date_string[13] == ':'
+                    and (day + month + year + hour + minute).isdigit()):
+                return datetime(int(year), int(month), int(day), int(hour), int(minute))
+        elif fmt == '%d/%m/%Y %I:%M:%S %p':
+            hour, minute, second = date_string[11:13], date_string[14:16], date_string[17:19]
+            meridiem = date_string[20:22].upper()
+            if (length == 22 and date_string[10] == ' ' and date_string[13] == ':' and date_string[16] == ':'
+                    and date_string[19] == ' ' and meridiem in ('AM', 'PM')
+                    and (day + month + year + hour + minute + second).isdigit()):
+                hour_12 = int(hour)
+                if 1 <= hour_12 <= 12:
+                    hour_24 = hour_12 % 12 + (12 if meridiem == 'PM' else 0)
+                    return datetime(int(year), int(month), int(day), hour_24, int(minute), int(second))
+    except ValueError:
+        # Out-of-range fields; strptime rejects these too
+        return None
+    return None
+
+# Formats that _parse_dmy_fast handles without strptime
+_FAST_DATE_FORMATS = frozenset({'%d/%m/%Y', '%d/%m/%Y %H:%M', '%d/%m/%Y %I:%M:%S %p'})
+
+@functools.lru_cache(maxsize=8192)
+def parse_date(date_string: str, formats: tuple) -> Optional[datetime]:
+    """Parse a date string with the first matching format, memoized on (string, formats).
+
+    Report dates repeat heavily across rows, so most lookups are cache hits
+    instead of another round of strptime attempts. Returns None if no format matches.
+    """
+    for fmt in formats:
+        if fmt in _FAST_DATE_FORMATS:
+            parsed_date = _parse_dmy_fast(date_string, fmt)
+            if parsed_date is not None:
+                return parsed_date
+        try:
+            return datetime.strptime(date_string, fmt)
+        except ValueError:
+            continue
+    return None
+
+# Field type codes, so ImportField.convert() dispatches on an int instead of comparing strings
+_T_STRING, _T_FLOAT, _T_INTEGER, _T_BOOLEAN, _T_DATETIME, _T_DECIMAL = range(6)
+
+def iter_row_values(headers: List[str], data: Iterable[Dict[str, Any]]) -> Iterator[List[Any]]:
+    """Yield each row's values in header order, with Decimals rounded half-up to cents.
+
+    Rows are read with a single C-level itemgetter call; a row missing a column raises
+    KeyError and falls back to per-column gets with the '' default.
+    """
+    # itemgetter needs at least one key and returns a bare value for exactly one
+    if len(headers) > 1:
+        get_row_values = operator.itemgetter(*headers)
+    else:
+        get_row_values = lambda item: tuple(item[col] for col in headers)
+    cents = decimal.Decimal('0.01')
+
+    for item in data:
+        try:
+            row_values = list(get_row_values(item))
+        except KeyError:
+            row_values = [item.get(col, '') for col in headers]
+
+        for col_idx, value in enumerate(row_values):
+            if isinstance(value, decimal.Decimal):
+                try:
+                    row_values[col_idx] = value.quantize(cents, rounding=decimal.ROUND_HALF_UP)
+                except (decimal.InvalidOperation, TypeError):
+                    row_values[col_idx] = ''
+        yield row_values
+
 class ImportField:
+    _TYPE_CODES = {
+        'string': _T_STRING,
+        'float': _T_FLOAT,
+        'integer': _T_INTEGER,
+        'boolean': _T_BOOLEAN,
+        'datetime': _T_DATETIME,
+        'decimal': _T_DECIMAL,
+    }
+
     def __init__(self, field_type: str, required: bool = False, formats: Optional[List[str]] = None):
         self.field_type = field_type
         self.required = required
         self.formats = formats or []
+        self._formats_key = tuple(self.formats)
+        self._type_code = self._TYPE_CODES.get(field_type, _T_STRING)
 
     def convert(self, value: Any) -> Any:
         if not value:
             return None if not self.required else value
+        type_code = self._type_code
         try:
-            if self.field_type == 'datetime':
+            if type_code == _T_DATETIME:
                 return self._parse_date(value)
-            elif self.field_type == 'float':
+            elif type_code == _T_FLOAT:
                 return float(value)
-            elif self.field_type == 'integer':
+            elif type_code == _T_INTEGER:
                 return int(value)
-            elif self.field_type == 'boolean':
-                return value.upper() in ['TRUE', 'YES', 'Y', '1'] if isinstance(value, str) else bool(value)
-            elif self.field_type == 'decimal':
+            elif type_code == _T_BOOLEAN:
+                if isinstance(value, str):
+                    # Exact-case hits skip the upper() allocation
+                    return value in _TRUE_STRINGS or value.upper() in _TRUE_STRINGS
+                return bool(value)
+            elif type_code == _T_DECIMAL:
                 cleaned_value = re.sub(r'[^\d.]', '', str(value))
                 return decimal.Decimal(cleaned_value)
             return value
         except (ValueError, TypeError, decimal.InvalidOperation) as e:
-            logger.warning(f'Conversion error for value {value} to type {self.field_type}: {str(e)}')
+            logger.warning('Conversion error for value %s to type %s: %s', value, self.field_type, e)
             return value
 
     def _parse_date(self, date_string: str) -> Optional[datetime]:
         if not date_string:
             return None
-        for fmt in self.formats:
-            try:
-                return datetime.strptime(date_string, fmt)
-            except ValueError:
-                continue
-        logger.warning(f'Failed to parse date {date_string} with formats {self.formats}')
-        return None
+        parsed_date = parse_date(date_string, self._formats_key)
+        if parsed_date is None:
+            logger.warning('Failed to parse date %s with formats %s', date_string, self.formats)
+        return parsed_date
 
 class ExportField:
     def __init__(self, field_type: str, number_format: Optional[str] = None):
@@ -85,40 +188,44 @@ class BaseSchema:
         self.schema = schema
 
 class ImportSchema(BaseSchema):
-    def import_data(self, raw_data: bytes, errors: List[str]) -> List[Dict[str, Any]]:
+    def iter_data(self, raw_data: bytes, errors: List[str]) -> Iterator[Dict[str, Any]]:
+        """Yields converted rows one at a time so callers can filter without holding the whole file"""
         try:
-            text = raw_data.decode('utf-8-sig')
-            reader = csv.DictReader(io.StringIO(text))
-            data = []
+            # Decode lazily while parsing instead of building the whole file as one string first
+            text_stream = io.TextIOWrapper(io.BytesIO(raw_data), encoding='utf-8-sig', newline='')
+            reader = csv.DictReader(text_stream)
             row_count = 0
             conversion_errors = 0
 
+            # Flatten the schema once so each cell costs one dict lookup
+            field_specs = {field: (field_schema.required, field_schema.convert)
+                           for field, field_schema in self.schema.items()}
+
             for row in reader:
                 row_count += 1
                 converted_row = {}
                 row_errors = 0
 
                 for field, value in row.items():
-                    if field not in self.schema:
+                    spec = field_specs.get(field)
+                    if spec is None:
                         converted_row[field] = value
                         continue
 
-                    field_schema = self.schema[field]
-                    if not value and field_schema.required:
-                        logger.warning(f'Missing required field {field} in row {row_count}')
+                    required, convert = spec
+                    if not value and required:
+                        logger.warning('Missing required field %s in row %s', field, row_count)
                         row_errors += 1
-                    converted_row[field] = field_schema.convert(value) if value else None
+                    converted_row[field] = convert(value) if value else None
 
                 if row_errors > 0:
                     conversion_errors += 1
-                data.append(converted_row)
+                yield converted_row
 
             logger.info(f'Imported {row_count} rows, with {conversion_errors} conversion errors')
-            return data
         except Exception as e:
             errors.append(f'Error importing data: {str(e)}')
             logger.error(f'Error importing data', exc_info=True)
-            return []
 
 class ExportSchema(BaseSchema):
     def __init__(self, schema: Dict[str, ExportField], sort_by: Optional[str] = None, 
@@ -145,34 +252,29 @@ class ExportSchema(BaseSchema):
                     logger.warning(f"Failed to sort data by '{self.sort_by}' for sheet '{sheet_name}': {str(sort_error)}")
                     sorted_data = data
 
-            for row_idx, item in enumerate(sorted_data, start=2):
-                row_values = []
-                for col_idx, col in enumerate(headers, start=1):
-                    value = item.get(col, '')
-                    if isinstance(value, decimal.Decimal):
-                        try:
-                            value = value.quantize(decimal.Decimal('0.01'), rounding=decimal.ROUND_HALF_UP)
-                        except (decimal.InvalidOperation, TypeError):
-                            value = ''
-                    row_values.append(value)
-                
-                # First add the row values directly to cells
-                for col_idx, value in enumerate(row_values, start=1):
-                    cell = sheet.cell(row=row_idx, column=col_idx)
-                    cell.value = value
-                    
-                    # Apply conditional formatting if specified
-                    if self.conditional_formats and context:
-                        column_name = headers[col_idx - 1]
-                        for conditional_format in self.conditional_formats:
-                            if conditional_format.column == column_name:
-                                if conditional_format.should_apply(value, context):
-                                    conditional_format.apply_format(cell)
-                    
-                # Then apply number formats if specified
-                for col_idx, col in enumerate(headers, start=1):
-                    if col in self.schema and self.schema[col].number_format:
-                        sheet.cell(row=row_idx, column=col_idx).number_format = self.schema[col].number_format
+            # Formatting is fixed per column, so resolve it once instead of per cell
+            styled_columns = []
+            for col_idx, col in enumerate(headers):
+                number_format = self.schema[col].number_format
+                conditional_formats = ([cf for cf in self.conditional_formats if cf.column == col]
+                                       if self.conditional_formats and context else [])
+                if number_format or conditional_formats:
+                    styled_columns.append((col_idx, number_format, conditional_formats))
+
+            # Rows are appended whole so write-only worksheets can stream them;
+            # only cells that carry formatting are wrapped in a styled cell
+            for row_values in iter_row_values(headers, sorted_data):
+                for col_idx, number_format, conditional_formats in styled_columns:
+                    value = row_values[col_idx]
+                    cell = WriteOnlyCell(sheet, value=value)
+                    for conditional_format in conditional_formats:
+                        if conditional_format.should_apply(value, context):
+                            conditional_format.apply_format(cell)
+                    if number_format:
+                        cell.number_format = number_format
+                    row_values[col_idx] = cell
+
+                sheet.append(row_values)
 
             logger.info(f'Exported {len(sorted_data)} rows to {sheet_name} sheet')
             if self.conditional_formats: